@@ -76,6 +76,19 @@ function parseMaybeJSONString<T = any>(v: any): T {
   return v as T;
 }
 
+// Server broadcasts only carry the changed board entries ("board_delta"); patch them into the last full board
+function applyBoardDelta(board: any, delta: any): any {
+  const next: any = { ...board };
+  for (const kind of ["tiles", "vertices", "edges"]) {
+    if (!Array.isArray(delta?.[kind]) || !delta[kind].length) continue;
+    next[kind] = [...board[kind]];
+    for (const entry of delta[kind]) {
+      next[kind][entry.id] = { ...next[kind][entry.id], ...entry };
+    }
+  }
+  return next;
+}
+
 function looksLikeSelfEntry(raw: any): boolean {
   if (!raw || typeof raw !== "object") return false;
   const hasHandObj = !!(raw.resources || raw.hand);
@@ -495,6 +508,7 @@ export default function App() {
 
   /** ----- WebSocket (shared for lobby and game) ----- */
   const wsRef = useRef<WebSocket | null>(null);
+  const boardRef = useRef<any>(null);
 
   // Helper to send actions to the server over WS
   function sendAction(payload: Record<string, any>) {
@@ -514,6 +528,7 @@ export default function App() {
 
     const ws = new WebSocket(`${WS_URL}/ws/${gameId}/${playerId}`); // ws://.../ws/{game_id}/{player_id}
     wsRef.current = ws;
+    ws.binaryType = "arraybuffer"; // game states arrive as binary frames with UTF-8 JSON
 
     ws.onopen = () => {
       // Add self to observed list
@@ -523,7 +538,8 @@ export default function App() {
 
     ws.onmessage = (ev) => {
       let data: any;
-      try { data = JSON.parse(ev.data); } catch { data = ev.data; }
+      const text = typeof ev.data === "string" ? ev.data : new TextDecoder().decode(ev.data);
+      try { data = JSON.parse(text); } catch { data = text; }
 
 
       if (data?.type === "lobby_state" && Array.isArray(data.players)) {
@@ -572,12 +588,20 @@ export default function App() {
       }
 
       // --- GAME START SIGNALS ---
-      // server sends {"game_state":"True"} to all when start called, followed by per-player snapshot
+      // the server starts the game with the per-player full snapshot (handled below);
+      // {"game_state":"True"} is only kept for older servers
       if (data?.game_state === "True") {
         setPhase("game");
         return;
       }
 
+      if (data?.board) {
+        boardRef.current = data.board;
+      } else if (data?.board_delta && boardRef.current) {
+        boardRef.current = applyBoardDelta(boardRef.current, data.board_delta);
+        data.board = boardRef.current;
+      }
+
       // --- FULL SNAPSHOT DURING GAME ---
       if (data?.board && data?.players) {
         setPhase("game");
@@ -1,5 +1,42 @@
 from game import Board
+from game import static_board
 import random
+import bisect
+
+# Canonical ordering of resources and development cards, shared by hands, bank and validation
+RESOURCES = ("wood", "brick", "sheep", "wheat", "ore")
+DEVELOPMENT_CARDS = ("knight", "victory_point", "road_building", "year_of_plenty", "monopoly")
+ROAD_COST = {"wood": 1, "brick": 1}
+
+# Request Helpers
+def action_int(action: dict, key: str) -> int | None:
+    # ids arrive as JSON numbers (or numeric strings), None if missing or malformed
+    try:
+        return int(action.get(key))
+    except (TypeError, ValueError):
+        return None
+
+
+# Hand Helpers (keep the public totals in sync with the hand)
+def grant_resource(players: dict, player_id: int, resource: str, amount: int = 1) -> None:
+    players[player_id]["hand"][resource] += amount
+    players[player_id]["total_hand"] += amount
+
+
+def take_resource(players: dict, player_id: int, resource: str, amount: int = 1) -> None:
+    players[player_id]["hand"][resource] -= amount
+    players[player_id]["total_hand"] -= amount
+
+
+def grant_development_card(players: dict, player_id: int, card: str) -> None:
+    players[player_id]["development_cards"][card] += 1
+    players[player_id]["total_development_cards"] += 1
+
+
+def take_development_card(players: dict, player_id: int, card: str) -> None:
+    players[player_id]["development_cards"][card] -= 1
+    players[player_id]["total_development_cards"] -= 1
+
 
 # Basic Actions
 def roll_dice(board: Board, players, player_id: int, bank: dict) -> int: 
@@ -12,7 +49,7 @@ def roll_dice(board: Board, players, player_id: int, bank: dict) -> int:
     number = random.randint(1, 6) + random.randint(1, 6)
     if number == 7: return 7 # Robber 
 
-    total_ressource = {"wood": 0, "brick": 0, "sheep": 0, "wheat": 0, "ore": 0}
+    total_ressource = dict.fromkeys(RESOURCES, 0)
     for tile in board.tiles:
         if tile.number == number and tile.robber == False:
             for vertex in tile.vertices:
@@ -32,20 +69,27 @@ def roll_dice(board: Board, players, player_id: int, bank: dict) -> int:
                         if board.vertices[vertex].owner != None:
                             owner = board.vertices[vertex].owner
                             if board.vertices[vertex].building == "settlement":
-                                players[owner]["hand"][resource] += 1
+                                grant_resource(players, owner, resource, 1)
                             elif board.vertices[vertex].building == "city":
-                                players[owner]["hand"][resource] += 2
+                                grant_resource(players, owner, resource, 2)
     
     # If not enough resources in bank, no resources are distributed
     return number
 
 
+def receive_resources(player_id: int, players: dict, resources: dict, bank: dict) -> None:
+    # bank -> player, counterpart of remove_resources (callers make sure the bank can pay)
+    for resource, amount in resources.items():
+        grant_resource(players, player_id, resource, amount)
+        bank[resource] -= amount
+
+
 def remove_resources(player_id: int, players: dict, resources: dict, bank: dict) -> bool:
     for resource, amount in resources.items():
         if players[player_id]["hand"].get(resource, 0) < amount:
             return False
     for resource, amount in resources.items():
-        players[player_id]["hand"][resource] -= amount
+        take_resource(players, player_id, resource, amount)
         bank[resource] += amount
     return True
  
@@ -95,10 +139,10 @@ def place_settlement(board, vertex_id: int, player_id: int, players: dict, bank:
     players[player_id]["ports"].append(port_type)
 
     players[player_id]["settlements"] -= 1
-    players[player_id]["hand"]["brick"] -= 1
-    players[player_id]["hand"]["wood"] -= 1
-    players[player_id]["hand"]["sheep"] -= 1
-    players[player_id]["hand"]["wheat"] -= 1
+    take_resource(players, player_id, "brick")
+    take_resource(players, player_id, "wood")
+    take_resource(players, player_id, "sheep")
+    take_resource(players, player_id, "wheat")
     players[player_id]["victory_points"] += 1
     bank["brick"] += 1
     bank["wood"] += 1
@@ -122,8 +166,8 @@ def place_city(board: Board, vertex_id: int, player_id: int, players: dict, bank
     
     players[player_id]["cities"] -= 1
     players[player_id]["settlements"] += 1
-    players[player_id]["hand"]["ore"] -= 3
-    players[player_id]["hand"]["wheat"] -= 2
+    take_resource(players, player_id, "ore", 3)
+    take_resource(players, player_id, "wheat", 2)
     players[player_id]["victory_points"] += 1
     bank["ore"] += 3
     bank["wheat"] += 2
@@ -143,8 +187,8 @@ def place_road(board: Board, edge_id: int, player_id: int, players: dict, bank:
         return False
         
     players[player_id]["roads"] -= 1
-    players[player_id]["hand"]["brick"] -= 1
-    players[player_id]["hand"]["wood"] -= 1
+    take_resource(players, player_id, "brick")
+    take_resource(players, player_id, "wood")
     bank["brick"] += 1
     bank["wood"] += 1
     board.edges[edge_id].owner = player_id
@@ -200,10 +244,10 @@ def buy_development_card(player_id: int, development_cards: list, players: dict,
         return False
     
     card = development_cards.pop()
-    players[player_id]["development_cards"][card] += 1
-    players[player_id]["hand"]["sheep"] -= 1
-    players[player_id]["hand"]["wheat"] -= 1
-    players[player_id]["hand"]["ore"] -= 1
+    grant_development_card(players, player_id, card)
+    take_resource(players, player_id, "sheep")
+    take_resource(players, player_id, "wheat")
+    take_resource(players, player_id, "ore")
     bank["sheep"] += 1
     bank["wheat"] += 1
     bank["ore"] += 1
@@ -223,7 +267,7 @@ def play_knight(player_id: int, players: dict, this_turn_cards: dict) -> bool:
     # stealing is handled in steal_resource function
     players[player_id]["played_card_this_turn"] = True
     players[player_id]["played_knights"] += 1
-    players[player_id]["development_cards"]["knight"] -= 1
+    take_development_card(players, player_id, "knight")
 
     # check largest army
     if players[player_id]["played_knights"] >= 3:
@@ -248,7 +292,7 @@ def play_road_building(player_id: int, players: dict, this_turn_cards: list) ->
     if players[player_id]["development_cards"]["road_building"] <= this_turn_cards["road_building"]:
         return False
 
-    players[player_id]["development_cards"]["road_building"] -= 1
+    take_development_card(players, player_id, "road_building")
     players[player_id]["played_card_this_turn"] = True
 
     return True
@@ -261,7 +305,7 @@ def play_year_of_plenty(player_id: int, players: dict, this_turn_cards: list) ->
     if players[player_id]["development_cards"]["year_of_plenty"] <= this_turn_cards["year_of_plenty"]:
         return False
 
-    players[player_id]["development_cards"]["year_of_plenty"] -= 1
+    take_development_card(players, player_id, "year_of_plenty")
     players[player_id]["played_card_this_turn"] = True
     return True
 
@@ -273,7 +317,7 @@ def play_monopoly(player_id: int, players: dict, this_turn_cards: list) -> bool:
     if players[player_id]["development_cards"]["monopoly"] <= this_turn_cards["monopoly"]:
         return False
     
-    players[player_id]["development_cards"]["monopoly"] -= 1
+    take_development_card(players, player_id, "monopoly")
     players[player_id]["played_card_this_turn"] = True
     return True
     
@@ -320,10 +364,23 @@ def can_play_monopoly(player_id: int, players: dict) -> bool:
 
 # Trade Actions
 
+# Trade responses are kept as sorted lists of player ids, so they can be sent as they are
+def add_sorted(player_ids: list[int], player_id: int) -> None:
+    index = bisect.bisect_left(player_ids, player_id)
+    if index == len(player_ids) or player_ids[index] != player_id:
+        player_ids.insert(index, player_id)
+
+
+def remove_sorted(player_ids: list[int], player_id: int) -> None:
+    index = bisect.bisect_left(player_ids, player_id)
+    if index < len(player_ids) and player_ids[index] == player_id:
+        del player_ids[index]
+
+
 def can_do_trade_player(player_id: int, resource_give: dict, players: dict) -> bool:
     # player must have enough of each offered resource
     for resource, amount in resource_give.items():
-        if resource not in ["wood", "brick", "sheep", "wheat", "ore"]:
+        if resource not in RESOURCES:
             return False
         if amount <= 0:
             return False
@@ -334,7 +391,7 @@ def can_do_trade_player(player_id: int, resource_give: dict, players: dict) -> b
 
 def port_ratios_for_player(player_id: int, players: dict) -> dict:
     # defaults
-    ratios = {r: 4 for r in ["wood", "brick", "sheep", "wheat", "ore"]}
+    ratios = dict.fromkeys(RESOURCES, 4)
     ports = players[player_id].get("ports", []) or []
     for port in ports:
         if port is None:
@@ -352,7 +409,7 @@ def port_ratios_for_player(player_id: int, players: dict) -> dict:
 def can_do_trade_bank(player_id: int, resource_give: dict, resource_receive: dict, players: dict, bank: dict) -> bool:
     # validate receive side (bank must have enough)
     for resource, amount in resource_receive.items():
-        if resource not in ["wood", "brick", "sheep", "wheat", "ore"]:
+        if resource not in RESOURCES:
             return False
         if amount <= 0:
             return False
@@ -388,20 +445,20 @@ def complete_trade_player(trader_id: int, partner_id: int, offer: dict, request:
 
     # execute transfer
     for r, a in offer.items():
-        players[trader_id]["hand"][r] -= a
-        players[partner_id]["hand"][r] += a
+        take_resource(players, trader_id, r, a)
+        grant_resource(players, partner_id, r, a)
     for r, a in request.items():
-        players[partner_id]["hand"][r] -= a
-        players[trader_id]["hand"][r] += a
+        take_resource(players, partner_id, r, a)
+        grant_resource(players, trader_id, r, a)
     return True
 
 
 def complete_trade_bank(player_id: int, resource_give: dict, resource_receive: dict, players: dict, bank: dict) -> bool:
     for resource, amount in resource_give.items():
-        players[player_id]["hand"][resource] -= amount
+        take_resource(players, player_id, resource, amount)
         bank[resource] += amount
     for resource, amount in resource_receive.items():
-        players[player_id]["hand"][resource] += amount
+        grant_resource(players, player_id, resource, amount)
         bank[resource] -= amount
     return True
 
@@ -421,24 +478,33 @@ def trade_possible(player_id: int, offer: dict, request: dict, players: dict, ba
 
 # Misc Actions
 def calculate_longest_road(board, player_id: int, players: dict) -> None: 
+    # Flat owner lists and the static adjacency tables, so the search only does tuple/list indexing
+    edge_owner = [edge.owner for edge in board.edges]
+    vertex_owner = [vertex.owner for vertex in board.vertices]
+    vertex_edges = static_board.VERTEX_EDGE
+    edge_vertices = static_board.EDGE_VERTEX
+
     max_length = 0
-    for vertex in board.vertices:
-        for edge in vertex.edges:
-            if board.edges[edge].owner == player_id:
-                stack = [(edge, vertex.id, 1)]  # (current_edge, visited_edges and current vertex, current_length)
-                visited_edges = {edge}
-                while stack:
-                    current_edge, last_vertex, length = stack.pop()
-                    max_length = max(max_length, length)
-
-                    for vertex_2 in board.edges[current_edge].vertices:
-                        if vertex_2 == last_vertex or (board.vertices[vertex_2].owner not in (None, player_id)):
-                            continue
-
-                        for next_edge in board.vertices[vertex_2].edges:
-                            if board.edges[next_edge].owner == player_id and next_edge not in visited_edges:
-                                visited_edges.add(next_edge)
-                                stack.append((next_edge, vertex_2, length + 1))
+    # every search starts on one of the player's roads, leaving it through either end
+    for edge, owner in enumerate(edge_owner):
+        if owner != player_id:
+            continue
+        for start_vertex in edge_vertices[edge]:
+            stack = [(edge, start_vertex, 1)]  # (current_edge, visited_edges and current vertex, current_length)
+            visited_edges = {edge}
+            while stack:
+                current_edge, last_vertex, length = stack.pop()
+                if length > max_length:
+                    max_length = length
+
+                for vertex_2 in edge_vertices[current_edge]:
+                    if vertex_2 == last_vertex or vertex_owner[vertex_2] not in (None, player_id):
+                        continue
+
+                    for next_edge in vertex_edges[vertex_2]:
+                        if edge_owner[next_edge] == player_id and next_edge not in visited_edges:
+                            visited_edges.add(next_edge)
+                            stack.append((next_edge, vertex_2, length + 1))
                 
     players[player_id]["longest_road_length"] = max_length
 
@@ -477,7 +543,7 @@ def update_longest_road(players: dict) -> None:
 def steal_resource(board: Board, stealer_id: int, victim_id: int, players: dict) -> bool: 
     if not can_steal(board, stealer_id, victim_id):
         return False
-    if sum(players[victim_id]["hand"].values()) == 0: # No resources to steal
+    if players[victim_id]["total_hand"] == 0: # No resources to steal
         return True
     
     resource = random.choices(
@@ -485,8 +551,8 @@ def steal_resource(board: Board, stealer_id: int, victim_id: int, players: dict)
         weights=list(players[victim_id]["hand"].values()),
         k=1
     )[0]
-    players[victim_id]["hand"][resource] -= 1
-    players[stealer_id]["hand"][resource] += 1
+    take_resource(players, victim_id, resource)
+    grant_resource(players, stealer_id, resource)
     return True
 
 
@@ -501,15 +567,15 @@ def can_steal(board: Board, stealer_id: int, victim_id: int) -> bool:
             return True
     return False 
 
-def robbable_players_on_tile(board: Board, players: dict, tile_id: int, current: int) -> list[int]:
+def robbable_players_on_tile(board: Board, players: dict, tile_id: int, current: int) -> set[int]:
     vertices = board.tiles[tile_id].vertices
     seen = set()
     for vertex in vertices:
         if board.vertices[vertex].building is not None and board.vertices[vertex].owner != current:
-            if sum(players[board.vertices[vertex].owner]["hand"].values()) > 0:
+            if players[board.vertices[vertex].owner]["total_hand"] > 0:
                 seen.add(board.vertices[vertex].owner)
     
-    return sorted(seen)
+    return seen
 
 
 def initial_placement_round(board: Board, vertex_id: int, player_id: int, players: dict) -> bool:
@@ -166,6 +166,23 @@ class Board:
             ]
         }
 
+    # Only the mutable fields of the given entries (same keys as board_to_json), used for incremental updates
+    def board_delta_to_json(self, tile_ids, vertex_ids, edge_ids) -> dict:
+        return {
+            "tiles": [
+                {"id": tile_id, "robber": self.tiles[tile_id].robber}
+                for tile_id in sorted(tile_ids)
+            ],
+            "vertices": [
+                {"id": vertex_id, "building": self.vertices[vertex_id].building, "player": self.vertices[vertex_id].owner}
+                for vertex_id in sorted(vertex_ids)
+            ],
+            "edges": [
+                {"id": edge_id, "player": self.edges[edge_id].owner}
+                for edge_id in sorted(edge_ids)
+            ]
+        }
+
     def reset_board(self) -> None:
         self.tiles = [None]*19
         self.create_board()
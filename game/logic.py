@@ -1,21 +1,67 @@
 import random
 import json
+import msgspec
 from game.action import *
 from game.board import Board
 
+# Actions that change ownership or the robber on the board (invalidate the cached board json)
+BOARD_ACTIONS = {"place_road", "place_settlement", "place_city", "move_robber"}
+# Actions that can change the longest road (settlements can split an opponent's road)
+ROAD_AFFECTING = {"place_road", "place_settlement"}
+# Actions after which the acting player is checked for a win: everything that can raise their victory points
+# (buildings, vp cards, longest road, largest army), plus roll_dice so a player who got to 10 on someone
+# else's action (longest road moving to them after an opponent's settlement split a road) wins at their next turn
+VP_AFFECTING = {"place_settlement", "place_city", "place_road", "buy_development_card", "play_knight_card", "roll_dice"}
+# Actions that may still be taken while a forced action is pending
+FORCED_ACTION_ALLOWED = {"discard_resources", "move_robber", "robber_steal", "Year of Plenty", "Monopoly", "place_road", "Trade Pending", "accept_trade", "decline_trade", "confirm_trade", "end_trade"}
+
+json_encoder = msgspec.json.Encoder()
+
+# Returned by call_action(..., broadcast=False) on success, unlike True it can never equal a winning player_id
+ACTION_SUCCEEDED = "action_succeeded"
+
+# Initial state of every player, copied in add_player
+PLAYER_TEMPLATE = {
+    "hand": None, # dict.fromkeys(RESOURCES, 0)
+    "development_cards": None, # dict.fromkeys(DEVELOPMENT_CARDS, 0)
+    "played_knights": 0,
+    "longest_road_length": 0,
+    "victory_points": 0,
+    "settlements": 5,
+    "cities": 4,
+    "roads": 15,
+    "ports": None, # []
+    "longest_road": False,
+    "largest_army": False,
+    "played_card_this_turn": False,
+    "dice_rolled": False,
+    "current_turn": False,
+
+    # For public state
+    "total_hand": 0,
+    "total_development_cards": 0,
+    "victory_points_without_vp_cards": 0
+}
+
 # Game Logic file
 class Game:
     def __init__(self):
         # Main Game State
         self.players = {}
-        self.bank = {"wood": 19, "brick": 19, "sheep": 19, "wheat": 19, "ore": 19}
+        self.player_ids: tuple[int, ...] = () # Cached tuple(self.players), updated in add_player/remove_player
+        self.bank = dict.fromkeys(RESOURCES, 19)
+        # Shuffled once, buy_development_card draws from the end with pop()
         self.development_cards = ["knight"] * 14 + ["victory_point"] * 5 + ["road_building"] * 2 + ["year_of_plenty"] * 2 + ["monopoly"] * 2
         random.shuffle(self.development_cards)
         self.number = None
         self.board = Board()
+        self.board_json: dict | None = None # Cached board_to_json(), reset whenever the board changes
+        self.board_changes = {"tiles": set(), "vertices": set(), "edges": set()} # Ids changed since the last broadcast
 
         # Inital Placement Phase
         self.initial_placement_order = None
+        self.initial_placement_length = 0 # len(initial_placement_order), fixed once the game starts
+        self.initial_placement_second_round = 0 # counter value where the second placement round begins
         self.counter = 0
         self.last_vertex_initial_placement = None
 
@@ -23,61 +69,77 @@ class Game:
         self.pending_discard: dict[int, int] = {}  # player_id -> number of cards to discard 
         self.forced_action: str | None = None  # One of NEXT_ACTION
 
-        self.robber_candidates: list[int] = []
+        self.robber_candidates: set[int] = set()
         self.pending_robber_tile: int | None = None
 
-        self.cards_bought_this_turn = {"knight": 0, "victory_point": 0, "road_building": 0, "year_of_plenty": 0, "monopoly": 0}
+        self.cards_bought_this_turn = dict.fromkeys(DEVELOPMENT_CARDS, 0) # Reset in place at the end of every turn
 
         self.temp_road_building = False # Used to track if the player is in the middle of placing roads from a road building card
 
         # Trading
         self.pending_trade: dict | None = None
-        self.no_partner: dict[int, dict] = {}
+        self.no_partner: dict[int, dict] = {} # player_id -> note, sent once with the next broadcast
 
         # Game Log TODO this will be implemented later
         self.game_log: list[dict] = []
 
+        # Action type -> handler, built once so process_action is a single lookup
+        self.action_handlers = {
+            "roll_dice": self.handle_roll_dice,
+            "end_turn": self.handle_end_turn,
+            "discard_resources": self.handle_discard_resources,
+            "move_robber": self.handle_move_robber,
+            "robber_steal": self.handle_robber_steal,
+            "place_road": self.handle_place_road,
+            "place_settlement": self.handle_place_settlement,
+            "place_city": self.handle_place_city,
+            "buy_development_card": self.handle_buy_development_card,
+            "play_knight_card": self.handle_play_knight_card,
+            "play_road_building_card": self.handle_play_road_building_card,
+            "play_year_of_plenty_card": self.handle_play_year_of_plenty_card,
+            "play_monopoly_card": self.handle_play_monopoly_card,
+            "Year of Plenty": self.handle_year_of_plenty,
+            "Monopoly": self.handle_monopoly,
+            "bank_trade": self.handle_bank_trade,
+            "propose_trade": self.handle_propose_trade,
+            "accept_trade": self.handle_accept_trade,
+            "confirm_trade": self.handle_confirm_trade,
+            "decline_trade": self.handle_decline_trade,
+            "end_trade": self.handle_end_trade,
+        }
+
     def add_player(self, player_id):
         if player_id not in self.players:
-            self.players[player_id] = {
-                "hand": {"wood": 0, "brick": 0, "sheep": 0, "wheat": 0, "ore": 0},
-                "development_cards": {"knight": 0, "victory_point": 0, "road_building": 0, "year_of_plenty": 0, "monopoly": 0},
-                "played_knights": 0,
-                "longest_road_length": 0,
-                "victory_points": 0,
-                "settlements": 5,
-                "cities": 4,
-                "roads": 15,
-                "ports": [],
-                "longest_road": False,
-                "largest_army": False,
-                "played_card_this_turn": False,
-                "dice_rolled": False,
-                "current_turn": False,
-                
-                # For public state
-                "total_hand": 0,  
-                "total_development_cards": 0,
-                "victory_points_without_vp_cards": 0  
-            }
+            player = PLAYER_TEMPLATE.copy()
+            # the template only holds immutable defaults, containers are created per player
+            player["hand"] = dict.fromkeys(RESOURCES, 0)
+            player["development_cards"] = dict.fromkeys(DEVELOPMENT_CARDS, 0)
+            player["ports"] = []
+            self.players[player_id] = player
+            self.player_ids = tuple(self.players)
     
     def remove_player(self, player_id):
         if player_id in self.players:
             del self.players[player_id]
+            self.player_ids = tuple(self.players)
 
-    def start_game(self):
+    def start_game(self, broadcast: bool = True):
         if len(self.players) < 2 or len(self.players) > 4:
             return False
-        current_turn = random.choice(list(self.players.keys()))
+        current_turn = random.choice(self.player_ids)
         self.players[current_turn]["current_turn"] = True
         order = list(range(1, len(self.players)+1))
         order = order[current_turn-1:] + order[:current_turn-1]
         order += order[::-1]
         self.initial_placement_order = [i for i in order for _ in (range(2))]
+        self.initial_placement_length = len(self.initial_placement_order)
+        self.initial_placement_second_round = self.initial_placement_length // 2
 
         # The initial placement phase is done separately, since it requires player interaction
         self.current_turn = current_turn
-        return self.get_multiplayer_game_state()
+        if not broadcast:
+            return True
+        return self.get_multiplayer_game_state(full_board=True)
     
 
     def initial_placement_phase(self, player_id: int, action: dict) -> dict:
@@ -87,34 +149,38 @@ class Game:
                     
         # check if action is even (settlement) or odd (road)
         if self.counter % 2 == 0: # settlement
-            if not action.get("type") == "place_settlement":
+            vertex_id = action_int(action, "vertex_id")
+            if not action.get("type") == "place_settlement" or vertex_id is None:
                 return False
-            if not initial_placement_round(board = self.board, vertex_id = int(action.get("vertex_id")), player_id = player_id, players = self.players):
+            if not initial_placement_round(board = self.board, vertex_id = vertex_id, player_id = player_id, players = self.players):
                 return False
+            self.board_changes["vertices"].add(vertex_id)
             
             # check if second round of initial placement
-            if self.counter >= len(self.initial_placement_order)//2:
+            if self.counter >= self.initial_placement_second_round:
                 # give resources for the settlement placed
-                for tile in self.board.vertices[int(action.get("vertex_id"))].tiles:
+                for tile in self.board.vertices[vertex_id].tiles:
                     resource = self.board.tiles[tile].resource
                     if resource != "Desert":
-                        self.players[player_id]["hand"][resource.lower()] += 1
+                        grant_resource(self.players, player_id, resource.lower())
                         self.bank[resource.lower()] -= 1
             
-            self.last_vertex_initial_placement = int(action.get("vertex_id"))
+            self.last_vertex_initial_placement = vertex_id
         
         else: # road
-            if not action.get("type") == "place_road":
+            edge_id = action_int(action, "edge_id")
+            if not action.get("type") == "place_road" or edge_id is None:
                 return False
             # check if edge is connected to last placed settlement
             if self.last_vertex_initial_placement is None:
                 return False
             connected_edges = self.board.vertices[self.last_vertex_initial_placement].edges
-            if int(action.get("edge_id")) not in connected_edges:
+            if edge_id not in connected_edges:
                 return False
             
-            if not initial_placement_round_road(board = self.board, edge_id = int(action.get("edge_id")), player_id = player_id, players = self.players, vertex_id=self.last_vertex_initial_placement):
+            if not initial_placement_round_road(board = self.board, edge_id = edge_id, player_id = player_id, players = self.players, vertex_id=self.last_vertex_initial_placement):
                 return False
+            self.board_changes["edges"].add(edge_id)
             
             self.last_vertex_initial_placement = None
         
@@ -123,31 +189,38 @@ class Game:
             
 
     
-    def call_action(self, player_id: int, action: dict) -> bool | dict:
-        if self.counter < len(self.initial_placement_order): # only allow initial placement actions
+    # broadcast=False skips building the game states (simulations / bots) and returns ACTION_SUCCEEDED instead
+    def call_action(self, player_id: int, action: dict, broadcast: bool = True) -> bool | int | str | dict:
+        action_type = action.get("type")
+        if self.counter < self.initial_placement_length: # only allow initial placement actions
             success = self.initial_placement_phase(player_id, action)
         else:
-            success = self.process_action(player_id, action)
+            success = self.process_action(player_id, action, action_type)
         
         if not success:
             return False
 
-        # Calculate longest road, as it can change after any action
-        for player_id in self.players.keys():
-            calculate_longest_road(self.board, player_id, self.players)
-        update_longest_road(self.players)
+        if action_type in BOARD_ACTIONS:
+            self.board_json = None
+
+        # Recalculate longest road, only roads and settlements can change it
+        if action_type in ROAD_AFFECTING:
+            for pid in self.player_ids:
+                calculate_longest_road(self.board, pid, self.players)
+            update_longest_road(self.players)
         
-        if self.players[player_id]["victory_points"] >= 10:
+        if action_type in VP_AFFECTING and self.players[player_id]["victory_points"] >= 10:
             return player_id  # player_id won
         
+        if not broadcast:
+            return ACTION_SUCCEEDED
+
         # return a list of game states for all players
         return self.get_multiplayer_game_state()
 
 
-    def process_action(self, player_id: int, action: dict) -> bool:
+    def process_action(self, player_id: int, action: dict, action_type: str) -> bool:
         # Validate turn and phase
-        action_type = action.get("type")
-
         # Out-of-turn actions allowed:
         if action_type == 'accept_trade' or action_type == 'decline_trade':
             pass
@@ -158,427 +231,457 @@ class Game:
         
 
         # If a forced action is active, restrict what the current player can do.
-        if self.forced_action and action_type not in ["discard_resources", "move_robber", "robber_steal", "Year of Plenty", "Monopoly", "place_road", "Trade Pending", "accept_trade", "decline_trade", "confirm_trade", "end_trade"]:
+        if self.forced_action and action_type not in FORCED_ACTION_ALLOWED:
             return False
         if self.pending_trade and player_id == self.current_turn and action_type == "end_turn":
             return False
 
         
         # Route action (Return False if action is invalid)
-        match action_type:
-            # General actions
-            case "roll_dice":
-                self.number = roll_dice(board = self.board, players = self.players, player_id = player_id, bank = self.bank)
-                if self.number is False:
-                    return False
-                
-                if self.number == 7:
-                    self.pending_discard.clear()
-                    for pid, pdata in self.players.items():
-                        total_cards = sum(pdata["hand"].values())
-                        if total_cards > 7:
-                            self.pending_discard[pid] = total_cards // 2
-                        
-                    if self.pending_discard:
-                        self.forced_action = "Discard"
-                    else:
-                        self.forced_action = "Move Robber"
-
-                return True
-            
-            case "end_turn":
-                if end_turn(player_id = player_id, players = self.players):
-                    self.number = None
-                    self.current_turn = (self.current_turn % len(self.players)) + 1
-                    self.cards_bought_this_turn = {"knight": 0, "victory_point": 0, "road_building": 0, "year_of_plenty": 0, "monopoly": 0}
-                    return True
-                else:
-                    return False
-            
-            case "discard_resources":
-                # Only valid during forced Discard phase and only for players who still owe
-                if self.forced_action != "Discard" or player_id not in self.pending_discard or self.pending_discard[player_id] <= 0:
-                    return False
-                owed = self.pending_discard.get(player_id, 0)
-                if owed <= 0:
-                    return False
-
-                # Validate discard request
-                resources = action.get("resources", {}) or {}
-                total_to_remove = sum(int(resources.get(k, 0)) for k in ["wood","brick","sheep","wheat","ore"])
-                if total_to_remove != owed:
-                    return False
-
-                # Attempt to remove resources
-                success = remove_resources(player_id = player_id, players = self.players, resources = resources, bank = self.bank)
-                if not success:
-                    return False
-
-                # Mark this player's discard as satisfied
-                self.pending_discard[player_id] = 0
-
-                # If all finished, advance to robber placement
-                if all(v <= 0 for v in self.pending_discard.values()):
-                    self.forced_action = "Move Robber"
-
-                return True
-            
-            case "move_robber":
-                # Only current player resolves robber
-                if player_id != self.current_turn or self.forced_action != "Move Robber":
-                    return False
-                
-                target_tile = int(action.get("target_tile"))
-                # Step 1: placing the robber (always allowed when called)
-                if not move_robber(board=self.board, new_tile_id=target_tile):
-                    return False
-
-                # Figure out eligible victims at this tile (exclude self)
-                cands = robbable_players_on_tile(board = self.board, players= self.players, tile_id=target_tile, current=player_id)
-                self.pending_robber_tile = target_tile
-                self.robber_candidates = cands
-                self.forced_action = "Steal Resource" if cands else None
-                return True
-
-            case "robber_steal":
-                # Current player must pick among announced candidates
-                if self.forced_action != "Steal Resource" or player_id != self.current_turn:
-                    return False
-                
-                victim = int(action.get("victim_id"))
-                if victim not in (self.robber_candidates or []):
-                    return False
-                if not steal_resource(board=self.board, players=self.players, stealer_id=player_id, victim_id=victim):
-                    return False
-                
-                self.robber_candidates = []
-                self.pending_robber_tile = None
-                self.forced_action = None
-                return True
+        handler = self.action_handlers.get(action_type)
+        if handler is None:
+            return False
+        return handler(player_id, action)
 
-            # Building actions
-            case "place_road":
-                if self.forced_action in ["Place Road 1", "Place Road 2"] and player_id == self.current_turn:
-                    
-                    self.temp_road_building = False
-                    if self.players[player_id]["dice_rolled"] == False:
-                            self.temp_road_building = True
-                            self.players[player_id]["dice_rolled"] = True
-
-                    if self.forced_action == "Place Road 1":
-                        self.players[player_id]["hand"]["wood"] += 1
-                        self.players[player_id]["hand"]["brick"] += 1
-                        self.bank["wood"] -= 1
-                        self.bank["brick"] -= 1
-
-                        if not place_road(board = self.board, edge_id = int(action.get("edge_id")), player_id = player_id, players = self.players, bank = self.bank):
-                            self.players[player_id]["hand"]["wood"] -= 1
-                            self.players[player_id]["hand"]["brick"] -= 1
-                            self.bank["wood"] += 1
-                            self.bank["brick"] += 1
-
-                            if self.temp_road_building:
-                                self.players[player_id]["dice_rolled"] = False
-                            return False
-                        
-                        if self.players[player_id]["roads"] <= 0:
-                            self.forced_action = None
-                        else:
-                            self.forced_action = "Place Road 2"
-                        
-                        if self.temp_road_building:
-                            self.players[player_id]["dice_rolled"] = False
-                        return True
-                    
-                    
-                    else: # Place Road 2
-                        self.players[player_id]["hand"]["wood"] += 1
-                        self.players[player_id]["hand"]["brick"] += 1
-                        self.bank["wood"] -= 1
-                        self.bank["brick"] -= 1
-                        
-                        if not place_road(board = self.board, edge_id = int(action.get("edge_id")), player_id = player_id, players = self.players, bank = self.bank):
-                            self.players[player_id]["hand"]["wood"] -= 1
-                            self.players[player_id]["hand"]["brick"] -= 1
-                            self.bank["wood"] += 1
-                            self.bank["brick"] += 1
-
-                            if self.temp_road_building:
-                                self.players[player_id]["dice_rolled"] = False
-                            return False
-
-                        if self.temp_road_building:
-                            self.players[player_id]["dice_rolled"] = False    
-                        self.forced_action = None
-                        return True
-                else:
-                    return place_road(board = self.board, edge_id = int(action.get("edge_id")), player_id = player_id, players = self.players, bank = self.bank)
-            
-            case "place_settlement":
-                return place_settlement(board = self.board, vertex_id = int(action.get("vertex_id")), player_id = player_id, players = self.players, bank = self.bank)
-            
-            case "place_city":
-                return place_city(board = self.board, vertex_id = int(action.get("vertex_id")), player_id = player_id, players = self.players, bank = self.bank)
-            
-            case "buy_development_card":
-                card = buy_development_card(player_id= player_id, development_cards = self.development_cards, players = self.players, bank = self.bank)
-                if not card:
-                    return False
-                self.cards_bought_this_turn[card] += 1
-                return True
-
-            # Development Card actions
-            case "play_knight_card":
-                if not play_knight(player_id = player_id, players = self.players, this_turn_cards = self.cards_bought_this_turn):
-                    return False
-                
+
+    # General actions
+    def handle_roll_dice(self, player_id: int, action: dict) -> bool:
+        self.number = roll_dice(board = self.board, players = self.players, player_id = player_id, bank = self.bank)
+        if self.number is False:
+            return False
+
+        if self.number == 7:
+            self.pending_discard.clear()
+            for pid, pdata in self.players.items():
+                total_cards = pdata["total_hand"]
+                if total_cards > 7:
+                    self.pending_discard[pid] = total_cards // 2
+
+            if self.pending_discard:
+                self.forced_action = "Discard"
+            else:
                 self.forced_action = "Move Robber"
-                return True
-                
-            case "play_road_building_card":
-                if not play_road_building(player_id = player_id, players = self.players, this_turn_cards = self.cards_bought_this_turn):
-                    return False
-                if self.players[player_id]["roads"] <= 0:
-                    return False
-                self.forced_action = "Place Road 1"
-                return True
-    
-            case "play_year_of_plenty_card":
-                if not play_year_of_plenty(player_id = player_id, players = self.players, this_turn_cards = self.cards_bought_this_turn):
-                    return False
-                self.forced_action = "Year of Plenty"
-                return True
-            
-            
-            case "play_monopoly_card":
-                if not play_monopoly(player_id = player_id, players = self.players, this_turn_cards = self.cards_bought_this_turn):
-                    return False
-                self.forced_action = "Monopoly"
-                return True
-            
-            case "Year of Plenty":
-                if self.forced_action != "Year of Plenty" or player_id != self.current_turn:
-                    return False
-                resources = action.get("resources", []) or []
-                if len(resources) != 2 or any(r not in ["wood","brick","sheep","wheat","ore"] for r in resources):
-                    return False
-                self.players[player_id]["hand"][resources[0]] += 1
-                self.players[player_id]["hand"][resources[1]] += 1
-                self.bank[resources[0]] -= 1
-                self.bank[resources[1]] -= 1
-                self.forced_action = None
-                return True
-                
-            case "Monopoly":
-                if self.forced_action != "Monopoly" or player_id != self.current_turn:
-                    return False
-                resource = action.get("resource")
-                if resource not in ["wood","brick","sheep","wheat","ore"]:
-                    return False
-                
-                total_collected = 0
-                for opponent_id in self.players:
-                    if opponent_id != player_id:
-                        total_collected += self.players[opponent_id]["hand"][resource]
-                        self.players[opponent_id]["hand"][resource] = 0
-                
-                self.players[player_id]["hand"][resource] += total_collected
+
+        return True
+
+
+    def handle_end_turn(self, player_id: int, action: dict) -> bool:
+        if end_turn(player_id = player_id, players = self.players):
+            self.number = None
+            self.current_turn = (self.current_turn % len(self.players)) + 1
+            for card in DEVELOPMENT_CARDS:
+                self.cards_bought_this_turn[card] = 0
+            return True
+        else:
+            return False
+
+
+    def handle_discard_resources(self, player_id: int, action: dict) -> bool:
+        # Only valid during forced Discard phase and only for players who still owe
+        if self.forced_action != "Discard" or player_id not in self.pending_discard or self.pending_discard[player_id] <= 0:
+            return False
+        owed = self.pending_discard.get(player_id, 0)
+        if owed <= 0:
+            return False
+
+        # Validate discard request (normalized to the fixed resource order, unknown keys are ignored)
+        resources = action.get("resources", {}) or {}
+        if not isinstance(resources, dict):
+            return False
+        discard = {resource: action_int(resources, resource) if resource in resources else 0 for resource in RESOURCES}
+        if None in discard.values(): # malformed amount
+            return False
+        if sum(discard.values()) != owed or min(discard.values()) < 0:
+            return False
+
+        # Attempt to remove resources (checks the hand before taking anything)
+        success = remove_resources(player_id = player_id, players = self.players, resources = discard, bank = self.bank)
+        if not success:
+            return False
+
+        # Mark this player's discard as satisfied
+        self.pending_discard[player_id] = 0
+
+        # If all finished, advance to robber placement
+        if all(v <= 0 for v in self.pending_discard.values()):
+            self.forced_action = "Move Robber"
+
+        return True
+
+
+    def handle_move_robber(self, player_id: int, action: dict) -> bool:
+        # Only current player resolves robber
+        if player_id != self.current_turn or self.forced_action != "Move Robber":
+            return False
+
+        target_tile = action_int(action, "target_tile")
+        if target_tile is None:
+            return False
+        previous_tile = self.board.robber_tile
+        # Step 1: placing the robber (always allowed when called)
+        if not move_robber(board=self.board, new_tile_id=target_tile):
+            return False
+        self.board_changes["tiles"].update((previous_tile, target_tile))
+
+        # Figure out eligible victims at this tile (exclude self)
+        cands = robbable_players_on_tile(board = self.board, players= self.players, tile_id=target_tile, current=player_id)
+        self.pending_robber_tile = target_tile
+        self.robber_candidates = cands
+        self.forced_action = "Steal Resource" if cands else None
+        return True
+
+
+    def handle_robber_steal(self, player_id: int, action: dict) -> bool:
+        # Current player must pick among announced candidates
+        if self.forced_action != "Steal Resource" or player_id != self.current_turn:
+            return False
+
+        victim = action_int(action, "victim_id")
+        if victim not in self.robber_candidates:
+            return False
+        if not steal_resource(board=self.board, players=self.players, stealer_id=player_id, victim_id=victim):
+            return False
+
+        self.robber_candidates = set()
+        self.pending_robber_tile = None
+        self.forced_action = None
+        return True
+
+
+    # Building actions
+    def handle_place_road(self, player_id: int, action: dict) -> bool:
+        edge_id = action_int(action, "edge_id")
+        if edge_id is None:
+            return False
+
+        if self.forced_action in ["Place Road 1", "Place Road 2"] and player_id == self.current_turn:
+            is_second = self.forced_action == "Place Road 2"
+
+            self.temp_road_building = False
+            if self.players[player_id]["dice_rolled"] == False:
+                    self.temp_road_building = True
+                    self.players[player_id]["dice_rolled"] = True
+
+            # the road is free: hand the cost over first, place_road charges it again
+            receive_resources(player_id = player_id, players = self.players, resources = ROAD_COST, bank = self.bank)
+            success = place_road(board = self.board, edge_id = edge_id, player_id = player_id, players = self.players, bank = self.bank)
+            if not success:
+                remove_resources(player_id = player_id, players = self.players, resources = ROAD_COST, bank = self.bank)
+            elif is_second or self.players[player_id]["roads"] <= 0:
                 self.forced_action = None
-                return True
-                
-
-            # Trade actions
-            case "bank_trade":
-                offer = action.get("offer", {}) or {}
-                request = action.get("request", {}) or {}
-                if not can_do_trade_bank(player_id=player_id, resource_give=offer, resource_receive=request, players=self.players, bank=self.bank):
-                    return False
-                return complete_trade_bank(player_id=player_id, resource_give=offer, resource_receive=request, players=self.players, bank=self.bank)
-
-            case "propose_trade":
-                if self.pending_trade is not None:
-                    return False  # only one active proposal at a time
-                offer = action.get("offer", {}) or {}
-                request = action.get("request", {}) or {}
-
-                if not trade_possible(player_id=player_id, offer=offer, request=request, players=self.players, bank=self.bank):
-                    return False
-
-                recipients = [pid for pid in self.players.keys() if pid != player_id]
-                if not recipients:
-                    return False
-
-                self.pending_trade = {
-                    "trader_id": player_id,
-                    "offer": offer,
-                    "request": request,
-                    "awaiting": set(recipients),
-                    "declined": set(),
-                    "accepted_by": set(),
-                    "target": None
-                }
-                # keep the current player's flow "locked" until resolved
-                self.forced_action = self.forced_action or "Trade Pending"
-                return True
-
-            case "accept_trade":
-                if self.pending_trade is None:
-                    return False
-
-                trader = self.pending_trade["trader_id"]
-                offer = self.pending_trade["offer"]
-                request = self.pending_trade["request"]
-                partner = player_id
-                if partner == trader:
-                    return False
- 
-                # must be one of the invited players
-                if partner not in self.players:
-                    return False
-       
-            
-                # Validate partner can pay request now
-                if not can_do_trade_player(partner, request, self.players):
-                    return False
-   
-                self.pending_trade["accepted_by"].add(partner)
-                if player_id in self.pending_trade["awaiting"]:
-                    self.pending_trade["awaiting"].remove(partner)
-                elif player_id in self.pending_trade["declined"]:
-                    self.pending_trade["declined"].remove(partner)
-
-                return True
-
-            case "confirm_trade":
-                if self.pending_trade is None:
-                    return False
-                if player_id != self.pending_trade["trader_id"]:
-                    return False
-                if not self.pending_trade["accepted_by"]:
-                    return False
-                
-                partner = action.get("target")
-                if partner not in self.pending_trade["accepted_by"]:
-                    return False
-
-                trader = self.pending_trade["trader_id"]
-                offer = self.pending_trade["offer"]
-                request = self.pending_trade["request"]
-
-                if not complete_trade_player(trader_id=trader, partner_id=partner, offer=offer, request=request, players=self.players):
-                    return False
-                
-                self.pending_trade = None
-                if self.forced_action == "Trade Pending":
-                    self.forced_action = None
-                return True
-
-            case "decline_trade":
-                if self.pending_trade is None:
-                    return False
-                trader = self.pending_trade["trader_id"]
-                partner = player_id
-                if partner == trader:
-                    return False
-                # mark response
-                if partner in self.pending_trade["awaiting"]:
-                    self.pending_trade["awaiting"].remove(partner)
-                    self.pending_trade["declined"].add(partner)
-                
-                elif partner in self.pending_trade["accepted_by"]:
-                    self.pending_trade["accepted_by"].remove(partner)
-                    self.pending_trade["declined"].add(partner)
-
-                return True
-            
-            case "end_trade":
-                if self.pending_trade is None:
-                    return False
-                if player_id != self.pending_trade["trader_id"]:
-                    return False
-                self.pending_trade = None
-                if self.forced_action == "Trade Pending":
-                    self.forced_action = None
-                return True
-
-
-            case _:
-                return False
+            else:
+                self.forced_action = "Place Road 2"
+
+            if self.temp_road_building:
+                self.players[player_id]["dice_rolled"] = False
+        else:
+            success = place_road(board = self.board, edge_id = edge_id, player_id = player_id, players = self.players, bank = self.bank)
+
+        if not success:
+            return False
+        self.board_changes["edges"].add(edge_id)
+        return True
+
+
+    def handle_place_settlement(self, player_id: int, action: dict) -> bool:
+        vertex_id = action_int(action, "vertex_id")
+        if vertex_id is None:
+            return False
+        if not place_settlement(board = self.board, vertex_id = vertex_id, player_id = player_id, players = self.players, bank = self.bank):
+            return False
+        self.board_changes["vertices"].add(vertex_id)
+        return True
+
+
+    def handle_place_city(self, player_id: int, action: dict) -> bool:
+        vertex_id = action_int(action, "vertex_id")
+        if vertex_id is None:
+            return False
+        if not place_city(board = self.board, vertex_id = vertex_id, player_id = player_id, players = self.players, bank = self.bank):
+            return False
+        self.board_changes["vertices"].add(vertex_id)
+        return True
+
+
+    def handle_buy_development_card(self, player_id: int, action: dict) -> bool:
+        card = buy_development_card(player_id= player_id, development_cards = self.development_cards, players = self.players, bank = self.bank)
+        if not card:
+            return False
+        self.cards_bought_this_turn[card] += 1
+        return True
+
+
+    # Development Card actions
+    def handle_play_knight_card(self, player_id: int, action: dict) -> bool:
+        if not play_knight(player_id = player_id, players = self.players, this_turn_cards = self.cards_bought_this_turn):
+            return False
+
+        self.forced_action = "Move Robber"
+        return True
+
+
+    def handle_play_road_building_card(self, player_id: int, action: dict) -> bool:
+        if not play_road_building(player_id = player_id, players = self.players, this_turn_cards = self.cards_bought_this_turn):
+            return False
+        if self.players[player_id]["roads"] <= 0:
+            return False
+        self.forced_action = "Place Road 1"
+        return True
+
+
+    def handle_play_year_of_plenty_card(self, player_id: int, action: dict) -> bool:
+        if not play_year_of_plenty(player_id = player_id, players = self.players, this_turn_cards = self.cards_bought_this_turn):
+            return False
+        self.forced_action = "Year of Plenty"
+        return True
+
+
+    def handle_play_monopoly_card(self, player_id: int, action: dict) -> bool:
+        if not play_monopoly(player_id = player_id, players = self.players, this_turn_cards = self.cards_bought_this_turn):
+            return False
+        self.forced_action = "Monopoly"
+        return True
+
+
+    def handle_year_of_plenty(self, player_id: int, action: dict) -> bool:
+        if self.forced_action != "Year of Plenty" or player_id != self.current_turn:
+            return False
+        resources = action.get("resources", []) or []
+        if len(resources) != 2 or any(r not in RESOURCES for r in resources):
+            return False
+        grant_resource(self.players, player_id, resources[0])
+        grant_resource(self.players, player_id, resources[1])
+        self.bank[resources[0]] -= 1
+        self.bank[resources[1]] -= 1
+        self.forced_action = None
+        return True
+
+
+    def handle_monopoly(self, player_id: int, action: dict) -> bool:
+        if self.forced_action != "Monopoly" or player_id != self.current_turn:
+            return False
+        resource = action.get("resource")
+        if resource not in RESOURCES:
+            return False
+
+        # single sweep over the opponents, only touching hands that hold the resource
+        total_collected = 0
+        for opponent_id in self.player_ids:
+            amount = self.players[opponent_id]["hand"][resource]
+            if opponent_id != player_id and amount:
+                total_collected += amount
+                take_resource(self.players, opponent_id, resource, amount)
+
+        if total_collected:
+            grant_resource(self.players, player_id, resource, total_collected)
+        self.forced_action = None
+        return True
+
+
+    # Trade actions
+    def handle_bank_trade(self, player_id: int, action: dict) -> bool:
+        offer = action.get("offer", {}) or {}
+        request = action.get("request", {}) or {}
+        if not can_do_trade_bank(player_id=player_id, resource_give=offer, resource_receive=request, players=self.players, bank=self.bank):
+            return False
+        return complete_trade_bank(player_id=player_id, resource_give=offer, resource_receive=request, players=self.players, bank=self.bank)
+
+
+    def handle_propose_trade(self, player_id: int, action: dict) -> bool:
+        if self.pending_trade is not None:
+            return False  # only one active proposal at a time
+        offer = action.get("offer", {}) or {}
+        request = action.get("request", {}) or {}
+
+        if not trade_possible(player_id=player_id, offer=offer, request=request, players=self.players, bank=self.bank):
+            return False
+
+        recipients = [pid for pid in self.player_ids if pid != player_id]
+        if not recipients:
+            return False
+
+        self.pending_trade = {
+            "trader_id": player_id,
+            "offer": offer,
+            "request": request,
+            "awaiting": sorted(recipients),
+            "declined": [],
+            "accepted_by": [],
+            "target": None
+        }
+        # keep the current player's flow "locked" until resolved
+        self.forced_action = self.forced_action or "Trade Pending"
+        return True
+
+
+    def handle_accept_trade(self, player_id: int, action: dict) -> bool:
+        if self.pending_trade is None:
+            return False
+
+        trader = self.pending_trade["trader_id"]
+        offer = self.pending_trade["offer"]
+        request = self.pending_trade["request"]
+        partner = player_id
+        if partner == trader:
+            return False
+
+        # must be one of the invited players
+        if partner not in self.players:
+            return False
+
+
+        # Validate partner can pay request now
+        if not can_do_trade_player(partner, request, self.players):
+            return False
+
+        add_sorted(self.pending_trade["accepted_by"], partner)
+        if player_id in self.pending_trade["awaiting"]:
+            remove_sorted(self.pending_trade["awaiting"], partner)
+        elif player_id in self.pending_trade["declined"]:
+            remove_sorted(self.pending_trade["declined"], partner)
+
+        return True
+
+
+    def handle_confirm_trade(self, player_id: int, action: dict) -> bool:
+        if self.pending_trade is None:
+            return False
+        if player_id != self.pending_trade["trader_id"]:
+            return False
+        if not self.pending_trade["accepted_by"]:
+            return False
+
+        partner = action.get("target")
+        if partner not in self.pending_trade["accepted_by"]:
+            return False
+
+        trader = self.pending_trade["trader_id"]
+        offer = self.pending_trade["offer"]
+        request = self.pending_trade["request"]
+
+        if not complete_trade_player(trader_id=trader, partner_id=partner, offer=offer, request=request, players=self.players):
+            return False
+
+        self.pending_trade = None
+        if self.forced_action == "Trade Pending":
+            self.forced_action = None
+        return True
+
+
+    def handle_decline_trade(self, player_id: int, action: dict) -> bool:
+        if self.pending_trade is None:
+            return False
+        trader = self.pending_trade["trader_id"]
+        partner = player_id
+        if partner == trader:
+            return False
+        # mark response
+        if partner in self.pending_trade["awaiting"]:
+            remove_sorted(self.pending_trade["awaiting"], partner)
+            add_sorted(self.pending_trade["declined"], partner)
+
+        elif partner in self.pending_trade["accepted_by"]:
+            remove_sorted(self.pending_trade["accepted_by"], partner)
+            add_sorted(self.pending_trade["declined"], partner)
+
+        return True
+
+
+    def handle_end_trade(self, player_id: int, action: dict) -> bool:
+        if self.pending_trade is None:
+            return False
+        if player_id != self.pending_trade["trader_id"]:
+            return False
+        self.pending_trade = None
+        if self.forced_action == "Trade Pending":
+            self.forced_action = None
+        return True
+
 
-   
     # Update we always want the full game state for each player (since hidden info) (And send it to everyone)
-    def get_multiplayer_game_state(self) -> dict:
-        # add total development cards and hand size for all players, so it can be used in public state
-        for _, pdata in self.players.items():
-            pdata["total_hand"] = sum(pdata["hand"].values())
-            pdata["total_development_cards"] = sum(pdata["development_cards"].values())
+    # Regular broadcasts only carry the board entries changed since the last one ("board_delta"),
+    # full_board=True sends the whole board instead (game start / (re)connect)
+    def get_multiplayer_game_state(self, full_board: bool = False) -> dict:
+        shared, private = self.split_game_state(full_board)
+        return {player: {**shared, **private[player]} for player in self.player_ids}
+
+
+    # Same states as get_multiplayer_game_state, already encoded as JSON.
+    # The shared part is encoded once and spliced into every player's object.
+    def get_multiplayer_game_state_json(self, full_board: bool = False) -> dict[int, bytes]:
+        shared, private = self.split_game_state(full_board)
+        shared_json = json_encoder.encode(shared)[:-1] # without the closing brace
+        return {player: shared_json + b"," + json_encoder.encode(private[player])[1:] for player in self.player_ids}
+
+
+    # (fields that are the same for everyone, player_id -> fields only that player gets)
+    def split_game_state(self, full_board: bool = False) -> tuple[dict, dict[int, dict]]:
+        # total_hand and total_development_cards are kept up to date by the hand helpers in action.py
+        for pdata in self.players.values():
             pdata["victory_points_without_vp_cards"] = pdata["victory_points"] - pdata["development_cards"]["victory_point"]
 
-        pending_trade_view = None
-        if self.pending_trade is not None:
-            # serialize sets for JSON
-            pending_trade_view = {
-                "trader_id": self.pending_trade["trader_id"],
-                "offer": self.pending_trade["offer"],
-                "request": self.pending_trade["request"],
-                "awaiting": sorted(list(self.pending_trade["awaiting"])),
-                "declined": sorted(list(self.pending_trade["declined"])),
-                "accepted_by": sorted(list(self.pending_trade["accepted_by"])),
-                "target": self.pending_trade["target"],
+        if full_board:
+            if self.board_json is None:
+                self.board_json = self.board.board_to_json()
+            shared = {"board": self.board_json}
+        else:
+            changes = self.board_changes
+            shared = {"board_delta": self.board.board_delta_to_json(changes["tiles"], changes["vertices"], changes["edges"])}
+            for changed_ids in changes.values():
+                changed_ids.clear()
+
+        shared.update({
+            "bank": self.bank,
+            "development_cards_remaining": len(self.development_cards),
+            "current_turn": self.current_turn,
+            "current_roll": self.number,
+            "initial_placement_order": self.initial_placement_order[self.counter] if self.counter < self.initial_placement_length else -1,
+
+            # Game flow 
+            "forced_action": self.forced_action,
+            "robber_candidates": sorted(self.robber_candidates), # [] or [2,3,...]
+            "pending_robber_tile": self.pending_robber_tile,     # int or None
+
+            "pending_trade": self.pending_trade, # response lists are already sorted
+        })
+
+        # public view of every player, built once and shared by all recipients
+        public_states = {pid: self.public_player_state(pid) for pid in self.player_ids}
+
+        private = {}
+        for player in self.player_ids:
+            public_player_data = {pid: state for pid, state in public_states.items() if pid != player}
+            private[player] = {
+                "players": {player: self.players[player], **public_player_data},
+                "must_discard": self.pending_discard.get(player, 0) if self.forced_action == "Discard" else 0,
             }
 
-        result = {}
-        for player in self.players.keys():
-            player_data = {player: self.players[player]}
-            public_player_data = self.public_player_state(player)
-            players = {**player_data, **public_player_data}
-            must_discard = self.pending_discard.get(player, 0) if self.forced_action == "Discard" else 0
-
-            result[player] = {
-                "board": self.board.board_to_json(),
-                "players": players,
-                "bank": self.bank,
-                "development_cards_remaining": len(self.development_cards),
-                "current_turn": self.current_turn,
-                "current_roll": self.number,
-                "initial_placement_order": self.initial_placement_order[self.counter] if self.counter < len(self.initial_placement_order) else -1,
-                
-                # Game flow 
-                "forced_action": self.forced_action,
-                "must_discard": must_discard,
-                "robber_candidates": self.robber_candidates,         # [] or [2,3,...]
-                "pending_robber_tile": self.pending_robber_tile,     # int or None
-
-                "pending_trade": pending_trade_view,
-                "no_partner": self.no_partner.get(player, {}),
-            }
-        
+        # only the affected players get a "no_partner" note, a missing key means no news
+        for player, note in self.no_partner.items():
+            if player in private:
+                private[player]["no_partner"] = note
         self.no_partner.clear()
-        return result
+        return shared, private
 
 
     def public_player_state(self, player_id: int) -> dict:
-        # all players except player_id
-        player_id_public_state = {}
-        for pid, pdata in self.players.items():
-            if pid == player_id:
-                continue
-            player_id_public_state[pid] = {
-                "total_hand": pdata["total_hand"],
-                "total_development_cards": pdata["total_development_cards"],
-                "victory_points_without_vp_cards": pdata["victory_points_without_vp_cards"],
-
-                "played_knights": pdata["played_knights"],
-                "longest_road_length": pdata["longest_road_length"],
-                "victory_points": pdata["victory_points"] - pdata["development_cards"]["victory_point"],
-                "settlements": pdata["settlements"],
-                "cities": pdata["cities"],
-                "roads": pdata["roads"],
-                "ports": pdata["ports"],
-                "longest_road": pdata["longest_road"],
-                "largest_army": pdata["largest_army"],
-                "played_card_this_turn": pdata["played_card_this_turn"],
-                "dice_rolled": pdata["dice_rolled"],
-                "current_turn": pdata["current_turn"]
-            }
-        return player_id_public_state
+        # what the other players may see of player_id
+        pdata = self.players[player_id]
+        return {
+            "total_hand": pdata["total_hand"],
+            "total_development_cards": pdata["total_development_cards"],
+            "victory_points_without_vp_cards": pdata["victory_points_without_vp_cards"],
+
+            "played_knights": pdata["played_knights"],
+            "longest_road_length": pdata["longest_road_length"],
+            "victory_points": pdata["victory_points"] - pdata["development_cards"]["victory_point"],
+            "settlements": pdata["settlements"],
+            "cities": pdata["cities"],
+            "roads": pdata["roads"],
+            "ports": pdata["ports"],
+            "longest_road": pdata["longest_road"],
+            "largest_army": pdata["largest_army"],
+            "played_card_this_turn": pdata["played_card_this_turn"],
+            "dice_rolled": pdata["dice_rolled"],
+            "current_turn": pdata["current_turn"]
+        }
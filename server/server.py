@@ -1,25 +1,99 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Depends, HTTPException
 from fastapi.responses import JSONResponse
 import uvicorn
 import asyncio
 import random
-from pydantic import BaseModel
+import heapq
+from collections import deque
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import sys
+import logging
+import logging.handlers
+import queue
+from contextlib import asynccontextmanager
 
-from game.logic import Game
+from game.logic import Game, json_encoder, ACTION_SUCCEEDED
 from game.action import *
 
-import json
+import msgspec
 
-app = FastAPI()
+# websocket frames and http bodies are encoded with msgspec
+# actions have to be json objects, anything else is rejected while decoding
+action_decoder = msgspec.json.Decoder(dict)
 
+class MsgspecJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return json_encoder.encode(content)
 
-GAMES = {} # game_id -> {"game_state": game_state, "websockets": {player_id: websocket}}
+# log records are only queued here, a background thread writes them so the event loop never blocks on stdout
+log_queue = queue.SimpleQueue()
+log = logging.getLogger("catan")
+log.setLevel(logging.INFO)
+log.addHandler(logging.handlers.QueueHandler(log_queue))
+log.propagate = False
+log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(sys.stdout))
 
-class GameIdRequest(BaseModel):
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_listener.start()
+    yield
+    log_listener.stop()
+
+app = FastAPI(default_response_class=MsgspecJSONResponse, lifespan=lifespan)
+
+# frames that never change are encoded once
+ACTION_FAILED_FRAME = json_encoder.encode({"status": "action_failed"})
+NOT_ENOUGH_PLAYERS_FRAME = json_encoder.encode({
+    "status": "game_over",
+    "message": "Not enough players to continue the game"
+})
+
+
+# Everything the server keeps for one game, slotted since it is read on every message
+class GameSlot:
+    __slots__ = ("game_state", "start_event", "websockets", "live_conns", "free_ids", "lobby_frame", "game_instance")
+
+    def __init__(self, host_id: int):
+        self.game_state = False # True once started
+        self.start_event = asyncio.Event()
+        self.websockets = {host_id: None} # player_id -> websocket, None until the player connects
+        self.live_conns = () # (player_id, websocket) of every connected player, what broadcasts iterate
+        self.free_ids = [i for i in range(1, 5) if i != host_id] # heap of unused player ids
+        self.lobby_frame = None
+        self.game_instance = None
+        self.refresh_lobby_frame()
+
+    # Has to be called whenever a websocket is attached or removed
+    def refresh_live_conns(self):
+        self.live_conns = tuple((pid, conn) for pid, conn in self.websockets.items() if conn)
+
+    # The lobby state is the same for everyone, so it is encoded once whenever the player list changes
+    def refresh_lobby_frame(self):
+        self.lobby_frame = json_encoder.encode({
+            "type": "lobby_state",
+            "players": sorted(self.websockets.keys())
+        })
+
+
+GAMES: dict[int, GameSlot] = {}
+
+# all game ids in random order, taken on create and given back when a game is removed
+AVAILABLE_GAME_IDS = deque(random.sample(range(1000, 10000), 9000))
+
+class GameIdRequest(msgspec.Struct):
     game_id: int
 
+# strict=False still accepts game ids sent as strings
+game_id_decoder = msgspec.json.Decoder(GameIdRequest, strict=False)
+
+# Request bodies are decoded and validated by msgspec instead of pydantic
+async def game_id_request(request: Request) -> GameIdRequest:
+    try:
+        return game_id_decoder.decode(await request.body())
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
 
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 
@@ -31,74 +105,129 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# How long a broadcast waits for a client that does not read its frames (seconds)
+SEND_TIMEOUT = 10
+
+closing_tasks = set() # keeps references to the background closes of dropped clients
+
+
+# Sends payloads[i] to conns[i], all sends run concurrently so one slow or failing socket
+# does not hold up or abort the others
+async def send_all(conns: tuple, payloads: list[bytes]):
+    results = await asyncio.gather(
+        *(asyncio.wait_for(conn.send_bytes(payload), SEND_TIMEOUT) for (_, conn), payload in zip(conns, payloads)),
+        return_exceptions=True
+    )
+    for (pid, conn), result in zip(conns, results):
+        if isinstance(result, asyncio.TimeoutError):
+            # state frames are deltas and cannot be skipped, so a client that stops reading is dropped
+            # instead of stalling the game, its handler ends on the closed socket and runs remove_connection
+            log.warning(f"Player {pid} is not reading, closing the connection")
+            task = asyncio.ensure_future(conn.close(code=1008))
+            closing_tasks.add(task)
+            task.add_done_callback(closing_tasks.discard)
+        elif isinstance(result, Exception):
+            log.warning(f"Failed to send to player {pid}: {result!r}")
+
+
+# Sends a separate frame to every connected player (player_id -> frame)
+async def broadcast_frames(game: GameSlot, frames: dict[int, bytes]):
+    conns = game.live_conns
+    await send_all(conns, [frames[pid] for pid, _ in conns])
+
+
+# Sends the same payload to every connected player
+async def broadcast(game: GameSlot, payload: bytes):
+    conns = game.live_conns
+    await send_all(conns, [payload] * len(conns))
+
+
 @app.post("/create")
 async def create_game():
-    game_id = random.randint(1000, 9999)
-    while game_id in GAMES:
-        game_id = random.randint(1000, 9999)
-    print(f"Creating game {game_id}")
+    if not AVAILABLE_GAME_IDS:
+        return MsgspecJSONResponse(status_code=503, content={"message": "No free game ids"})
+    game_id = AVAILABLE_GAME_IDS.popleft()
+    log.info(f"Creating game {game_id}")
     
-    GAMES[game_id] = {"game_state": False, "websockets": {}}
     player_id = 1
-    GAMES[game_id]["websockets"][player_id] = None  # Placeholder for WebSocket connection
+    GAMES[game_id] = GameSlot(player_id)
     return {"game_id": game_id, "player_id": player_id}
 
 
 @app.post("/join")
-async def join_game(req: GameIdRequest):
+async def join_game(req: GameIdRequest = Depends(game_id_request)):
     game_id = req.game_id
-    print(f"Joining game {game_id}")
+    log.info(f"Joining game {game_id}")
     if game_id not in GAMES:
-        return JSONResponse(status_code=404, content={"message": "Game not found"})
-    if len(GAMES[game_id]["websockets"]) >= 4:
-        return JSONResponse(status_code=400, content={"message": "Game is full"})
-    if GAMES[game_id]["game_state"]:
-        return JSONResponse(status_code=400, content={"message": "Game has already started"})
+        return MsgspecJSONResponse(status_code=404, content={"message": "Game not found"})
+    game = GAMES[game_id]
+    if not game.free_ids:
+        return MsgspecJSONResponse(status_code=400, content={"message": "Game is full"})
+    if game.game_state:
+        return MsgspecJSONResponse(status_code=400, content={"message": "Game has already started"})
 
-    # check existing player ids and assign the lowest available (1,2,3,4)
-    player_id = min(set(range(1, 5)) - set(GAMES[game_id]["websockets"].keys()))
-    GAMES[game_id]["websockets"][player_id] = None  # Placeholder for WebSocket connection
+    # assign the lowest available player id (1,2,3,4)
+    player_id = heapq.heappop(game.free_ids)
+    game.websockets[player_id] = None  # Placeholder for WebSocket connection
+    game.refresh_lobby_frame()
 
-    for conn in GAMES[game_id]["websockets"].values():
-        if conn:
-            await conn.send_json({"status": "player_joined", "player_id": player_id})
+    await broadcast(game, json_encoder.encode({"status": "player_joined", "player_id": player_id}))
 
     return {"player_id": player_id, "game_id": game_id}
 
 
 @app.post("/game/{game_id}/start")
-async def start_game(req: GameIdRequest):
+async def start_game(req: GameIdRequest = Depends(game_id_request)):
     game_id = req.game_id
     if game_id not in GAMES:
-        return JSONResponse(status_code=404, content={"message": "Game not found"})
-    if GAMES[game_id]["game_state"]:
-        return JSONResponse(status_code=400, content={"message": "Game has already started"})
-    if len(GAMES[game_id]["websockets"]) < 2:
-        return JSONResponse(status_code=400, content={"message": "Not enough players to start the game"})
+        return MsgspecJSONResponse(status_code=404, content={"message": "Game not found"})
+    game = GAMES[game_id]
+    websockets = game.websockets
+    if game.game_state:
+        return MsgspecJSONResponse(status_code=400, content={"message": "Game has already started"})
+    if len(websockets) < 2:
+        return MsgspecJSONResponse(status_code=400, content={"message": "Not enough players to start the game"})
     
-    GAMES[game_id]["game_state"] = True
+    game.game_state = True
+    game.start_event.set()
     # create new game class instance here
-    GAMES[game_id]["game_instance"] = Game()
+    game_instance = game.game_instance = Game()
 
-    for player_id in GAMES[game_id]["websockets"].keys():
-        GAMES[game_id]['game_instance'].add_player(player_id)
+    for player_id in websockets.keys():
+        game_instance.add_player(player_id)
 
-    for conn in GAMES[game_id]["websockets"].values():
-        if conn:
-            await conn.send_json({"game_state": "True"})
-    
     # start game
-    start_state = GAMES[game_id]['game_instance'].start_game()
+    game_instance.start_game(broadcast=False)
+    start_frames = game_instance.get_multiplayer_game_state_json(full_board=True)
 
-    # send initial game state to all players
-    for player_id, conn in GAMES[game_id]["websockets"].items():
-        if conn:
-            await conn.send_json(start_state[player_id])
+    # send initial game state to all players, the full snapshot also moves the client into the game
+    # so this is the only message a player gets on start
+    await broadcast_frames(game, start_frames)
 
     return {"message": "Game started"}
 
 
 
+# Waits until the game is started, a client leaving the lobby raises WebSocketDisconnect
+async def wait_for_start(ws: WebSocket, start_event: asyncio.Event):
+    started = asyncio.ensure_future(start_event.wait())
+    received = None
+    try:
+        while not started.done():
+            received = asyncio.ensure_future(ws.receive())
+            await asyncio.wait((started, received), return_when=asyncio.FIRST_COMPLETED)
+            if not received.done():
+                received.cancel()
+                await asyncio.wait((received,))
+            elif received.result()["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(received.result().get("code", 1000))
+    finally:
+        # neither task may outlive the wait, whichever way it ends (disconnect, error or cancellation)
+        started.cancel()
+        if received is not None:
+            received.cancel()
+
+
 @app.websocket("/ws/{game_id}/{player_id}")
 async def websocket_endpoint(ws: WebSocket, game_id: int, player_id: int):
     # Only check origin if we are not allowing all (*)
@@ -106,84 +235,110 @@ async def websocket_endpoint(ws: WebSocket, game_id: int, player_id: int):
         origin = ws.headers.get("origin")
         if origin not in ALLOWED_ORIGINS:
             # You might want to log this failure for debugging
-            print(f"WS blocked origin: {origin} (Allowed: {ALLOWED_ORIGINS})")
+            log.warning(f"WS blocked origin: {origin} (Allowed: {ALLOWED_ORIGINS})")
             await ws.close(code=1008) 
             return
     
     await ws.accept()
 
-    if game_id not in GAMES or player_id not in GAMES[game_id]["websockets"]:
+    if game_id not in GAMES or player_id not in GAMES[game_id].websockets:
         await ws.close(code=1008)
         return
     
-    GAMES[game_id]["websockets"][player_id] = ws
+    game = GAMES[game_id]
+    websockets = game.websockets
+    websockets[player_id] = ws
+    game.refresh_live_conns()
 
-    await ws.send_json({
-        "type": "lobby_state",
-        "players": sorted(GAMES[game_id]["websockets"].keys())
-    })
+    await ws.send_bytes(game.lobby_frame)
 
+    game_instance = None
     try:
-        while not GAMES[game_id]["game_state"]:
-            await ws.send_json({"type": "ping"})
-            await asyncio.sleep(2)
-    
-        game_instance = GAMES[game_id]["game_instance"]
-        json.dump(game_instance.get_multiplayer_game_state()[player_id], open("player_state.json", "w"), indent=4)
-
-        await ws.send_json(game_instance.get_multiplayer_game_state()[player_id])
+        if not game.game_state:
+            # keepalive is left to the websocket protocol pings of uvicorn
+            # the start snapshot is sent by start_game
+            await wait_for_start(ws, game.start_event)
+            game_instance = game.game_instance
+        else:
+            # connected after the game was started
+            game_instance = game.game_instance
+            await ws.send_bytes(game_instance.get_multiplayer_game_state_json(full_board=True)[player_id])
 
         # Main Game Loop
         while True:
-            data = await ws.receive_json()
+            try:
+                data = action_decoder.decode(await ws.receive_text())
+            except msgspec.DecodeError:
+                await ws.send_bytes(ACTION_FAILED_FRAME)
+                continue
             
-            result = game_instance.call_action(player_id, data)
+            result = game_instance.call_action(player_id, data, broadcast=False)
             
-            # if result is false the aciton failed, if result is 1,2,3,4 the player has won, else the new game state is returned
+            # if result is false the aciton failed, if result is ACTION_SUCCEEDED the action succeeded, else the player_id that has won is returned
             if result is False: 
-                await ws.send_json({"status": "action_failed"})
-            elif result in [1,2,3,4]: # player_id won
-                for conn in GAMES[game_id]["websockets"].values():
-                    if conn:
-                        await conn.send_json({"status": "game_over", "winner": result})
-            else:
-                for pid, conn in GAMES[game_id]["websockets"].items():
-                    if conn:
-                        await conn.send_json(result[pid])
+                await ws.send_bytes(ACTION_FAILED_FRAME)
+            elif result == ACTION_SUCCEEDED:
+                # new game state, encoded once per player (shared part only once)
+                frames = game_instance.get_multiplayer_game_state_json()
+                await broadcast_frames(game, frames)
+            else: # player_id won
+                await broadcast(game, json_encoder.encode({"status": "game_over", "winner": result}))
     
-    except WebSocketDisconnect:
-        print(f"Player {player_id} disconnected from game {game_id}")
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError is what starlette raises once the socket was closed on our side (send_all drops
+        # clients that stop reading), the client is gone either way
+        pass
+    finally:
+        await remove_connection(game, game_id, player_id, ws, game_instance)
 
-        # Remove the websocket connection
-        if player_id in GAMES[game_id]["websockets"]:
-            GAMES[game_id]["websockets"].pop(player_id, None)
 
-        # if websockets is empty, remove the game
-        if not GAMES[game_id]["websockets"]:
-            GAMES.pop(game_id, None)
-            return
+# Cleans up after a player's websocket handler ended, for whatever reason it ended
+async def remove_connection(game: GameSlot, game_id: int, player_id: int, ws: WebSocket, game_instance: Game | None):
+    websockets = game.websockets
+
+    # already removed, or another connection has taken over this player
+    if websockets.get(player_id) is not ws:
+        return
+
+    log.info(f"Player {player_id} disconnected from game {game_id}")
+
+    # Remove the websocket connection
+    websockets.pop(player_id)
+    game.refresh_live_conns()
+    heapq.heappush(game.free_ids, player_id)
+    game.refresh_lobby_frame()
 
-        # Notify remaining players
-        for conn in GAMES[game_id]["websockets"].values():
-            if conn:
-                await conn.send_json({"status": "player_disconnected", "player_id": player_id})
+    # if websockets is empty, remove the game
+    if not websockets:
+        # only recycle the id if this handler removed the game, another handler may have done it already
+        if GAMES.get(game_id) is game:
+            del GAMES[game_id]
+            AVAILABLE_GAME_IDS.append(game_id)
+        return
+
+    # Notify remaining players
+    await broadcast(game, json_encoder.encode({"status": "player_disconnected", "player_id": player_id}))
+
+    # left while still in the lobby
+    if game_instance is None:
+        return
 
-        # Remove from game instance
-        if player_id in game_instance.players:
-            game_instance.remove_player(player_id)
+    # Remove from game instance
+    if player_id in game_instance.players:
+        game_instance.remove_player(player_id)
 
 
-        # Check if enough players remain
-        if len(game_instance.players) < 2:
-            GAMES[game_id]["game_state"] = False
-            for conn in GAMES[game_id]["websockets"].values():
-                if conn:
-                    await conn.send_json({
-                        "status": "game_over",
-                        "message": "Not enough players to continue the game"
-                    })
+    # Check if enough players remain
+    if len(game_instance.players) < 2:
+        game.game_state = False
+        game.start_event = asyncio.Event()
+        await broadcast(game, NOT_ENOUGH_PLAYERS_FRAME)
 
 
 
 def start_server(host, port):
-    uvicorn.run(app, host=host, port=port)
\ No newline at end of file
+    # loop and http stay on uvicorn's "auto", which already uses uvloop and httptools wherever
+    # uvicorn[standard] installs them and falls back to asyncio / h11 elsewhere (windows, pypy, cygwin)
+    # permessage-deflate is negotiated per connection and cannot be skipped per frame over ASGI,
+    # it stays on since the full snapshots are large and repetitive and the per-action deltas are small
+    uvicorn.run(app, host=host, port=port, ws_per_message_deflate=True)
\ No newline at end of file